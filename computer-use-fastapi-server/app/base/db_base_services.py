@@ -1,5 +1,6 @@
 """Base database interactions used across the app.
 """
+from sqlalchemy import func
 
 
 def get_instance():
@@ -24,6 +25,16 @@ def filter_instances(model, session, filters: dict, limit: int = 100, offset: in
     for key, value in filters.items():
         if hasattr(model, key) and value is not None:
             query = query.filter(getattr(model, key) == value)
-    total_count = query.count()
-    results = query.offset(offset).limit(limit).all()
+    # Window the count over the filtered set so page and total share one query
+    rows = (
+        query.add_columns(func.count().over().label("total"))
+        .offset(offset)
+        .limit(limit)
+        .all()
+    )
+    if not rows:
+        # Offset past the end yields no rows to read the total from
+        return [], query.count() if offset else 0
+    results = [row[0] for row in rows]
+    total_count = rows[0].total
     return results, total_count
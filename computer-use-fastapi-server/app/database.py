@@ -2,6 +2,7 @@ from typing import Generator
 from app.settings import settings
 from sqlalchemy import Engine, event, create_engine
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.exc import SQLAlchemyError
 from app.settings import logger
 
@@ -14,6 +15,11 @@ engine: Engine= create_engine(
         "check_same_thread": False,
         "timeout": 100,
     },
+    # Keep PRAGMA-initialized connections warm instead of reopening them
+    poolclass=QueuePool,
+    pool_size=10,
+    max_overflow=20,
+    pool_recycle=1800,
     future=True,
 )
 
@@ -25,6 +31,8 @@ SessionLocal = sessionmaker(
     bind=engine,
     autoflush=False,
     autocommit=False,
+    # Keep committed attributes loaded so responses don't re-SELECT them
+    expire_on_commit=False,
 )
 
 def get_session() -> Generator[Session, None, None]:
@@ -46,4 +54,8 @@ def set_sqlite_pragma(dbapi_connection, connection_record) -> None:
     cursor.execute("PRAGMA foreign_keys=ON")
     cursor.execute("PRAGMA journal_mode=WAL")
     cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA wal_autocheckpoint=1000")  # pages between WAL checkpoints
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-64000")  # 64 MB page cache
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB memory-mapped I/O
     cursor.close()
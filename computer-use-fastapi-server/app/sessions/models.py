@@ -1,7 +1,7 @@
 """SQLAlchemy models for session management."""
 from datetime import datetime
 from typing import Optional
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import Boolean, CheckConstraint, DateTime, ForeignKey, Index, Integer, String, Text, func
 from sqlalchemy.orm import Mapped, mapped_column
 from app.database import DeclarativeBase
 
@@ -10,6 +10,10 @@ class Session(DeclarativeBase):
     """Agent session model."""
 
     __tablename__ = "sessions"
+    __table_args__ = (
+        # Undashed uuid4 hex
+        CheckConstraint("length(id) = 32", name="ck_sessions_id_length"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -18,17 +22,23 @@ class Session(DeclarativeBase):
     # Screenshot storage configuration (per-session)
     store_screenshots: Mapped[bool] = mapped_column(Boolean, default=False)
     screenshot_scale: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=2)  # 1=full, 2=half, 4=quarter
-    screenshot_quality: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=70)  # JPEG quality 1-100
+    screenshot_quality: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=70)  # WebP quality 1-100
 
 
 class Message(DeclarativeBase):
     """Chat message model."""
 
     __tablename__ = "messages"
+    __table_args__ = (
+        # Serves both the session filter and the chronological ordering
+        Index("ix_messages_sid_created", "session_id", "created_at"),
+    )
+    # Fetch the server-side created_at in the INSERT itself (RETURNING)
+    __mapper_args__ = {"eager_defaults": True}
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     session_id: Mapped[str] = mapped_column(
-        String, ForeignKey("sessions.id", ondelete="CASCADE"), index=True
+        String, ForeignKey("sessions.id", ondelete="CASCADE")
     )
     content: Mapped[str] = mapped_column(Text)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
@@ -10,7 +10,7 @@ class SessionCreate(BaseModel):
     # Screenshot storage configuration (optional)
     store_screenshots: bool = Field(default=False, description="Whether to store screenshots in database")
     screenshot_scale: Optional[int] = Field(default=2, ge=1, le=8, description="Scale divisor: 1=full, 2=half, 4=quarter")
-    screenshot_quality: Optional[int] = Field(default=70, ge=10, le=100, description="JPEG quality (1-100)")
+    screenshot_quality: Optional[int] = Field(default=70, ge=10, le=100, description="WebP quality (1-100)")
 
 
 class SessionResponse(BaseModel):
@@ -0,0 +1,165 @@
+"""Screenshot resizing for stored agent messages.
+
+Kept free of app and database imports so worker processes can load it cheaply.
+"""
+import asyncio
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from typing import Optional
+
+try:
+    # SIMD-accelerated base64 when available, stdlib otherwise
+    from pybase64 import b64decode, b64encode_as_string
+except ImportError:
+    from base64 import b64decode, b64encode
+
+    def b64encode_as_string(s: bytes) -> str:
+        return b64encode(s).decode("ascii")
+
+try:
+    from PIL import Image
+except ImportError:
+    # PIL not installed, screenshots are stored as captured
+    Image = None
+
+
+# Original media type of screenshots captured by the computer tool
+SOURCE_MEDIA_TYPE = "image/png"
+
+# Full-size, near-lossless requests are stored as captured instead of re-encoded
+PASSTHROUGH_MIN_QUALITY = 95
+
+# Resized screenshots keyed by (content digest, scale, quality), shared across sessions
+SCREENSHOT_CACHE_SIZE = 64
+_screenshot_cache: "OrderedDict[tuple[bytes, int, int], tuple[str, str]]" = OrderedDict()
+_screenshot_cache_lock = threading.Lock()
+
+# Worker processes for resizing, created on first use
+RESIZE_POOL_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+_resize_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _cache_key(base64_image: str, scale: int, quality: int) -> tuple[bytes, int, int]:
+    digest = hashlib.blake2b(base64_image.encode("ascii"), digest_size=16).digest()
+    return digest, scale, quality
+
+
+def _cache_get(key: tuple[bytes, int, int]) -> Optional[tuple[str, str]]:
+    with _screenshot_cache_lock:
+        cached = _screenshot_cache.get(key)
+        if cached is not None:
+            _screenshot_cache.move_to_end(key)
+        return cached
+
+
+def _cache_put(key: tuple[bytes, int, int], resized: tuple[str, str]) -> None:
+    with _screenshot_cache_lock:
+        _screenshot_cache[key] = resized
+        if len(_screenshot_cache) > SCREENSHOT_CACHE_SIZE:
+            _screenshot_cache.popitem(last=False)
+
+
+def _is_passthrough(scale: int, quality: int) -> bool:
+    return Image is None or (scale <= 1 and quality >= PASSTHROUGH_MIN_QUALITY)
+
+
+def _get_resize_pool() -> ProcessPoolExecutor:
+    global _resize_pool
+    if _resize_pool is None:
+        _resize_pool = ProcessPoolExecutor(max_workers=RESIZE_POOL_WORKERS)
+    return _resize_pool
+
+
+def _discard_resize_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next resize starts a fresh one."""
+    global _resize_pool
+    if _resize_pool is pool:
+        _resize_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_resize_pool() -> None:
+    """Stop the resize worker processes, e.g. on application shutdown."""
+    global _resize_pool
+    if _resize_pool is not None:
+        _resize_pool.shutdown(wait=True, cancel_futures=True)
+        _resize_pool = None
+
+
+async def resize_screenshot_in_pool(base64_image: str, scale: int, quality: int) -> tuple[str, str]:
+    """Resize and compress a base64 screenshot, running cache misses in a worker process.
+
+    Returns the base64 image and its media type. The cache stays in this
+    process; only misses pay the pickling round-trip.
+    """
+    if _is_passthrough(scale, quality):
+        return base64_image, SOURCE_MEDIA_TYPE
+
+    key = _cache_key(base64_image, scale, quality)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    loop = asyncio.get_running_loop()
+    pool = _get_resize_pool()
+    try:
+        resized = await loop.run_in_executor(
+            pool, _resize_screenshot, base64_image, scale, quality
+        )
+    except BrokenExecutor:
+        # A worker died (e.g. OOM-killed); replace the pool, store the original
+        _discard_resize_pool(pool)
+        return base64_image, SOURCE_MEDIA_TYPE
+    except Exception:
+        # Any other executor error (e.g. pickling), store the original
+        return base64_image, SOURCE_MEDIA_TYPE
+
+    _cache_put(key, resized)
+    return resized
+
+
+def _resize_screenshot(base64_image: str, scale: int, quality: int) -> tuple[str, str]:
+    """Resize and compress a base64 screenshot to WebP using integer scaling."""
+    try:
+        # Decode base64 image
+        image_data = b64decode(base64_image, validate=False)
+        image = Image.open(io.BytesIO(image_data))
+
+        # Apply integer scaling (1=full, 2=half, 4=quarter, etc.)
+        if scale > 1:
+            width, height = image.size
+            new_size = (width // scale, height // scale)
+
+            # Let libjpeg downscale during decode (1/2, 1/4, 1/8); the
+            # drafted size may overshoot the target for other divisors
+            if image.format == 'JPEG':
+                image.draft('RGB', new_size)
+
+            if image.size == (width, height) and scale in (2, 4, 8) and image.mode != 'P':
+                # Dedicated integer box reduction, much cheaper than a
+                # generic resize; the box trims any remainder pixels
+                image = image.reduce(scale, box=(0, 0, new_size[0] * scale, new_size[1] * scale))
+            elif image.size != new_size:
+                # Box averaging is exact for power-of-two divisors and far
+                # cheaper than LANCZOS
+                resample = (
+                    Image.Resampling.BOX if scale in (2, 4, 8)
+                    else Image.Resampling.LANCZOS
+                )
+                image = image.resize(new_size, resample)
+
+        # Convert to WebP and compress (method 4 balances encode speed and size)
+        buffer = io.BytesIO()
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGB')
+        image.save(buffer, format='WEBP', quality=quality, method=4)
+
+        # Encode back to base64
+        return b64encode_as_string(buffer.getvalue()), "image/webp"
+    except Exception:
+        # Any error, return original
+        return base64_image, SOURCE_MEDIA_TYPE
@@ -1,60 +1,73 @@
 """Business logic for agent session management."""
 import asyncio
-import base64
-import io
-import json
 import uuid
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Callable, Dict, Optional
+import orjson
+from sqlalchemy import and_, or_, select
 from sqlalchemy.orm import Session
 from fastapi import WebSocket
 
+from app.settings import settings
 from .models import Session as SessionModel, Message as MessageModel
 from .schemas import SessionCreate
+from .screenshots import resize_screenshot_in_pool
 from computer_use_demo.loop import sampling_loop, APIProvider
 from computer_use_demo.tools import ToolResult
 from anthropic.types.beta import BetaContentBlockParam
 
 
 # Track active agent tasks and their message buffers for concurrent execution
-active_sessions: Dict[str, Dict] = {}  # {session_id: {"task": Task, "buffer": list, "db": Session}}
-
-
-def resize_screenshot(base64_image: str, scale: int, quality: int) -> str:
-    """Resize and compress a base64 screenshot using integer scaling."""
-    try:
-        from PIL import Image
-
-        # Decode base64 image
-        image_data = base64.b64decode(base64_image)
-        image = Image.open(io.BytesIO(image_data))
-
-        # Apply integer scaling (1=full, 2=half, 4=quarter, etc.)
-        if scale > 1:
-            width, height = image.size
-            new_size = (width // scale, height // scale)
-            image = image.resize(new_size, Image.Resampling.LANCZOS)
-
-        # Convert to JPEG and compress
-        buffer = io.BytesIO()
-        if image.mode in ('RGBA', 'LA', 'P'):
-            image = image.convert('RGB')
-        image.save(buffer, format='JPEG', quality=quality, optimize=True)
-
-        # Encode back to base64
-        return base64.b64encode(buffer.getvalue()).decode('utf-8')
-    except ImportError:
-        # PIL not installed, return original
-        return base64_image
-    except Exception:
-        # Any error, return original
-        return base64_image
+active_sessions: Dict[str, Dict] = {}  # {session_id: {"task": Task, "buffer": list, "session_factory": callable, "screenshot_task": Task}}
+
+# Produces short-lived DB sessions, e.g. app.database.SessionLocal
+SessionFactory = Callable[[], Session]
+
+# WebSocket stream coalescing: events queued within this window share one frame
+STREAM_BATCH_WINDOW = 0.001  # seconds
+STREAM_BATCH_MAX_EVENTS = 32
+
+# Screenshots waiting to be resized per session; the oldest frame is dropped when full
+SCREENSHOT_QUEUE_SIZE = 4
+
+
+async def _send_stream_events(websocket: WebSocket, queue: asyncio.Queue) -> None:
+    """Drain queued stream events into as few WebSocket frames as possible.
+
+    A single event is sent as-is; several are wrapped as {"events": [...]}.
+    A None in the queue sends whatever is pending and stops the sender.
+    """
+    loop = asyncio.get_running_loop()
+    closing = False
+    while not closing:
+        event = await queue.get()
+        if event is None:
+            return
+        events = [event]
+
+        # Coalesce whatever else arrives within the batching window
+        deadline = loop.time() + STREAM_BATCH_WINDOW
+        while len(events) < STREAM_BATCH_MAX_EVENTS:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if event is None:
+                closing = True
+                break
+            events.append(event)
+
+        payload = events[0] if len(events) == 1 else {"events": events}
+        await websocket.send_text(orjson.dumps(payload).decode())
 
 
 def create_session(db: Session, session_data: Optional[SessionCreate] = None) -> SessionModel:
     """Create a new session with optional screenshot configuration."""
     session = SessionModel(
-        id=str(uuid.uuid4()),
+        id=uuid.uuid4().hex,
         status="active",
         store_screenshots=session_data.store_screenshots if session_data else False,
         screenshot_scale=session_data.screenshot_scale if session_data else 2,
@@ -62,7 +75,6 @@ def create_session(db: Session, session_data: Optional[SessionCreate] = None) ->
     )
     db.add(session)
     db.commit()
-    db.refresh(session)
     return session
 
 
@@ -71,19 +83,57 @@ def get_session(db: Session, session_id: str) -> Optional[SessionModel]:
     return db.query(SessionModel).filter(SessionModel.id == session_id).first()
 
 
-def list_sessions(db: Session) -> list[SessionModel]:
-    """List all sessions."""
-    return db.query(SessionModel).order_by(SessionModel.created_at.desc()).all()
+def list_sessions(db: Session, limit: Optional[int] = None) -> list[SessionModel]:
+    """List the most recent sessions, newest first."""
+    return (
+        db.query(SessionModel)
+        .order_by(SessionModel.created_at.desc())
+        .limit(limit or settings.session_list_page_size)
+        .all()
+    )
 
 
-def get_messages(db: Session, session_id: str) -> list[MessageModel]:
-    """Get all messages for a session."""
-    return (
-        db.query(MessageModel)
-        .filter(MessageModel.session_id == session_id)
-        .order_by(MessageModel.created_at.asc())
+def get_messages(
+    db: Session,
+    session_id: str,
+    before_id: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> list[MessageModel]:
+    """Get messages for a session in chronological order.
+
+    With a limit, returns the most recent `limit` messages that sort before
+    message `before_id` (or the newest ones when no cursor is given).
+    """
+    query = db.query(MessageModel).filter(MessageModel.session_id == session_id)
+    if before_id is not None:
+        # Keyset on the (created_at, id) sort key; ids alone are not
+        # chronological since screenshot results are inserted late
+        cursor_created_at = (
+            select(MessageModel.created_at)
+            .where(MessageModel.id == before_id)
+            .scalar_subquery()
+        )
+        query = query.filter(
+            or_(
+                MessageModel.created_at < cursor_created_at,
+                and_(
+                    MessageModel.created_at == cursor_created_at,
+                    MessageModel.id < before_id,
+                ),
+            )
+        )
+
+    if limit is None:
+        return query.order_by(MessageModel.created_at.asc(), MessageModel.id.asc()).all()
+
+    # Walk the (session_id, created_at) index backwards, then restore order
+    messages = (
+        query.order_by(MessageModel.created_at.desc(), MessageModel.id.desc())
+        .limit(limit)
         .all()
     )
+    messages.reverse()
+    return messages
 
 
 def add_message(db: Session, session_id: str, content: str) -> MessageModel:
@@ -91,7 +141,6 @@ def add_message(db: Session, session_id: str, content: str) -> MessageModel:
     message = MessageModel(session_id=session_id, content=content)
     db.add(message)
     db.commit()
-    db.refresh(message)
     return message
 
 
@@ -107,7 +156,6 @@ def finish_session(db: Session, session_id: str) -> Optional[SessionModel]:
 
     session.status = "finished"
     db.commit()
-    db.refresh(session)
     return session
 
 
@@ -128,22 +176,44 @@ def delete_session(db: Session, session_id: str) -> bool:
     return True
 
 
+def _insert_messages(session_factory: SessionFactory, mappings: list[dict]) -> None:
+    """Insert buffered message mappings in one short-lived DB session."""
+    with session_factory() as db:
+        db.execute(MessageModel.__table__.insert(), mappings)
+        db.commit()
+
+
+def _set_status(session_factory: SessionFactory, session_id: str, status: str) -> None:
+    """Update a session's status in one short-lived DB session."""
+    with session_factory() as db:
+        db.query(SessionModel).filter(SessionModel.id == session_id).update({"status": status})
+        db.commit()
+
+
 async def run_agent(
     session_id: str,
     message: str,
-    db: Session,
+    session_factory: SessionFactory,
     websocket: Optional[WebSocket] = None,
     api_key: Optional[str] = None,
 ):
-    """Run the computer use agent loop."""
-    from app.settings import settings
+    """Run the computer use agent loop.
 
-    session = get_session(db, session_id)
-    if not session:
-        return
+    DB connections are only checked out around reads and writes, never held
+    while waiting on the model.
+    """
+    with session_factory() as db:
+        session = get_session(db, session_id)
+        if not session:
+            return
 
-    session.status = "running"
-    db.commit()
+        session.status = "running"
+        db.commit()
+
+        # Copy screenshot settings out before the DB session closes
+        store_screenshots = session.store_screenshots
+        screenshot_scale = session.screenshot_scale or 2
+        screenshot_quality = session.screenshot_quality or 70
 
     messages = [{"role": "user", "content": [{"type": "text", "text": message}]}]
 
@@ -156,45 +226,142 @@ async def run_agent(
     pending_messages = []
     if session_id in active_sessions:
         active_sessions[session_id]["buffer"] = pending_messages
-        active_sessions[session_id]["db"] = db
+        active_sessions[session_id]["session_factory"] = session_factory
+
+    # Armed when a row enters an empty buffer so no row waits longer than
+    # message_flush_interval, even if nothing else is appended after it
+    flush_timer: Optional[asyncio.TimerHandle] = None
 
     def flush_messages():
         """Flush pending messages to database."""
+        nonlocal flush_timer
+        if flush_timer:
+            flush_timer.cancel()
+            flush_timer = None
         if pending_messages:
-            db.bulk_insert_mappings(MessageModel, pending_messages)
-            db.commit()
+            _insert_messages(session_factory, pending_messages)
             pending_messages.clear()
 
+    def buffer_message(content: dict, created_at: datetime):
+        """Buffer a message, flushing when the batch is full or has waited too long."""
+        nonlocal flush_timer
+        pending_messages.append({
+            "session_id": session_id,
+            "content": orjson.dumps(content).decode(),
+            "created_at": created_at
+        })
+        if len(pending_messages) >= settings.message_batch_size:
+            flush_messages()
+        elif not flush_timer:
+            flush_timer = asyncio.get_running_loop().call_later(
+                settings.message_flush_interval, flush_messages
+            )
+
+    # Stream events go through a queue so bursts are coalesced into fewer frames
+    stream_queue: asyncio.Queue = asyncio.Queue()
+    stream_sender = (
+        asyncio.create_task(_send_stream_events(websocket, stream_queue))
+        if websocket else None
+    )
+
+    def stream_event(event: dict):
+        """Queue an event for the WebSocket sender."""
+        if stream_sender:
+            if stream_sender.done():
+                # Surface send failures (e.g. disconnects) like a direct send would
+                stream_sender.result()
+            stream_queue.put_nowait(event)
+
+    async def close_stream():
+        """Send any queued events and stop the WebSocket sender."""
+        if stream_sender:
+            stream_queue.put_nowait(None)
+            await stream_sender
+
+    # Screenshots are resized by a per-session worker so the agent never waits on them
+    screenshot_queue: asyncio.Queue = asyncio.Queue(maxsize=SCREENSHOT_QUEUE_SIZE)
+    screenshot_in_flight: list = []
+
+    async def screenshot_worker():
+        """Resize queued screenshots and buffer their tool results."""
+        while True:
+            item = await screenshot_queue.get()
+            if item is None:
+                return
+            screenshot_in_flight.append(item)
+            created_at, content_data, base64_image = item
+            resized_image, media_type = await resize_screenshot_in_pool(
+                base64_image,
+                screenshot_scale,
+                screenshot_quality
+            )
+            screenshot_in_flight.clear()
+
+            content_data["screenshot"] = resized_image
+            content_data["screenshot_media_type"] = media_type
+            buffer_message(content_data, created_at)
+
+    screenshot_task = asyncio.create_task(screenshot_worker()) if store_screenshots else None
+    if session_id in active_sessions:
+        active_sessions[session_id]["screenshot_task"] = screenshot_task
+
+    def queue_screenshot(created_at: datetime, content_data: dict, base64_image: str):
+        """Hand a screenshot to the worker, dropping the oldest frame under backpressure."""
+        try:
+            screenshot_queue.put_nowait((created_at, content_data, base64_image))
+        except asyncio.QueueFull:
+            dropped_at, dropped_data, _ = screenshot_queue.get_nowait()
+            # Keep the dropped tool result, just without its screenshot
+            buffer_message(dropped_data, dropped_at)
+            screenshot_queue.put_nowait((created_at, content_data, base64_image))
+
+    async def close_screenshots():
+        """Wait for the worker to resize every queued screenshot."""
+        if screenshot_task:
+            if not screenshot_task.done():
+                await screenshot_queue.put(None)
+            await screenshot_task
+
+    def abandon_screenshots():
+        """Stop the worker and buffer unfinished tool results without screenshots."""
+        if not screenshot_task:
+            return
+        screenshot_task.cancel()
+        items = list(screenshot_in_flight)
+        while not screenshot_queue.empty():
+            item = screenshot_queue.get_nowait()
+            if item is not None:
+                items.append(item)
+        for created_at, content_data, _ in items:
+            buffer_message(content_data, created_at)
+
     try:
-        async def output_callback(content: BetaContentBlockParam):
+        # sampling_loop calls these without awaiting, so they must stay sync
+        def output_callback(content: BetaContentBlockParam):
+            # One clock read shared by the stream event and the stored row
+            now = datetime.utcnow()
+
             # Stream to WebSocket immediately
-            if websocket:
-                await websocket.send_json({
-                    "type": content.get("type", "text"),
-                    "content": content,
-                    "timestamp": datetime.utcnow().isoformat(),
-                })
+            stream_event({
+                "type": content.get("type", "text"),
+                "content": content,
+                "timestamp": now.isoformat(),
+            })
 
             # Add to buffer for batch insert
             if isinstance(content, dict):
-                pending_messages.append({
-                    "session_id": session_id,
-                    "content": json.dumps(content),
-                    "created_at": datetime.utcnow()
-                })
+                buffer_message(content, now)
 
-                # Flush when buffer reaches configured size
-                if len(pending_messages) >= settings.message_batch_size:
-                    flush_messages()
+        def tool_output_callback(tool_result: ToolResult, tool_id: str):
+            # One clock read shared by the stream event and the stored row
+            now = datetime.utcnow()
 
-        async def tool_output_callback(tool_result: ToolResult, tool_id: str):
             # Stream to WebSocket immediately
-            if websocket:
-                await websocket.send_json({
-                    "type": "tool_result",
-                    "content": {"tool_id": tool_id, "output": tool_result.output, "error": tool_result.error},
-                    "timestamp": datetime.utcnow().isoformat(),
-                })
+            stream_event({
+                "type": "tool_result",
+                "content": {"tool_id": tool_id, "output": tool_result.output, "error": tool_result.error},
+                "timestamp": now.isoformat(),
+            })
 
             # Build content for storage
             content_data = {
@@ -204,35 +371,20 @@ async def run_agent(
                 "error": tool_result.error
             }
 
-            # Optionally store screenshot if session has it enabled
-            if session.store_screenshots and tool_result.base64_image:
-                resized_image = resize_screenshot(
-                    tool_result.base64_image,
-                    session.screenshot_scale or 2,
-                    session.screenshot_quality or 70
-                )
-                content_data["screenshot"] = resized_image
+            # Optionally store screenshot if session has it enabled; the
+            # worker buffers the message once the screenshot is resized
+            if store_screenshots and tool_result.base64_image:
+                queue_screenshot(now, content_data, tool_result.base64_image)
+                return
 
             # Add to buffer for batch insert
-            pending_messages.append({
-                "session_id": session_id,
-                "content": json.dumps(content_data),
-                "created_at": datetime.utcnow()
-            })
-
-            # Flush when buffer reaches configured size
-            if len(pending_messages) >= settings.message_batch_size:
-                flush_messages()
+            buffer_message(content_data, now)
 
         def api_response_callback(request, response, error):
             pass
 
         # Store initial user message
-        pending_messages.append({
-            "session_id": session_id,
-            "content": json.dumps({"type": "text", "text": message, "role": "user"}),
-            "created_at": datetime.utcnow()
-        })
+        buffer_message({"type": "text", "text": message, "role": "user"}, datetime.utcnow())
 
         await sampling_loop(
             model="claude-sonnet-4-5-20250929",
@@ -250,41 +402,48 @@ async def run_agent(
             token_efficient_tools_beta=False,
         )
 
-        # Flush any remaining messages
+        # Finish pending screenshots, then flush any remaining messages
+        await close_screenshots()
         flush_messages()
 
-        session.status = "completed"
-        db.commit()
+        _set_status(session_factory, session_id, "completed")
 
-        if websocket:
-            await websocket.send_json({
-                "type": "completed",
-                "content": {"message": "Task completed"},
-                "timestamp": datetime.utcnow().isoformat(),
-            })
+        stream_event({
+            "type": "completed",
+            "content": {"message": "Task completed"},
+            "timestamp": datetime.utcnow().isoformat(),
+        })
+        await close_stream()
 
     except asyncio.CancelledError:
         # Task was cancelled (WebSocket disconnect) - flush messages and mark as cancelled
+        abandon_screenshots()
         flush_messages()
-        session.status = "cancelled"
-        db.commit()
+        _set_status(session_factory, session_id, "cancelled")
         raise  # Re-raise to properly cancel the task
 
     except Exception as e:
         # Flush any remaining messages before marking as error
+        abandon_screenshots()
         flush_messages()
 
-        session.status = "error"
-        db.commit()
+        _set_status(session_factory, session_id, "error")
 
-        if websocket:
-            await websocket.send_json({
-                "type": "error",
-                "content": {"error": str(e)},
-                "timestamp": datetime.utcnow().isoformat(),
-            })
+        stream_event({
+            "type": "error",
+            "content": {"error": str(e)},
+            "timestamp": datetime.utcnow().isoformat(),
+        })
+        await close_stream()
 
     finally:
+        if flush_timer:
+            flush_timer.cancel()
+        if stream_sender:
+            stream_sender.cancel()
+        if screenshot_task:
+            screenshot_task.cancel()
+
         # Cleanup: remove from active sessions
         if session_id in active_sessions:
             del active_sessions[session_id]
@@ -293,13 +452,13 @@ async def run_agent(
 def start_agent_task(
     session_id: str,
     message: str,
-    db: Session,
+    session_factory: SessionFactory,
     websocket: Optional[WebSocket] = None,
     api_key: str = None,
 ) -> asyncio.Task:
     """Start agent as background task for concurrent execution."""
-    task = asyncio.create_task(run_agent(session_id, message, db, websocket, api_key))
-    active_sessions[session_id] = {"task": task, "buffer": [], "db": db}
+    task = asyncio.create_task(run_agent(session_id, message, session_factory, websocket, api_key))
+    active_sessions[session_id] = {"task": task, "buffer": [], "session_factory": session_factory}
     return task
 
 
@@ -309,13 +468,15 @@ def cancel_agent_task(session_id: str):
         session_data = active_sessions[session_id]
         task = session_data["task"]
         buffer = session_data["buffer"]
-        db = session_data["db"]
+        session_factory = session_data["session_factory"]
+        screenshot_task = session_data.get("screenshot_task")
 
-        # Cancel the task
+        # Cancel the task and its screenshot worker
         task.cancel()
+        if screenshot_task:
+            screenshot_task.cancel()
 
         # Flush any pending messages
         if buffer:
-            db.bulk_insert_mappings(MessageModel, buffer)
-            db.commit()
+            _insert_messages(session_factory, buffer)
             buffer.clear()
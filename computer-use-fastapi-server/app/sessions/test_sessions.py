@@ -0,0 +1,235 @@
+from typing import List, Dict, Any
+import asyncio
+import json
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from httpx import Response
+from main import app
+from app.database import SessionLocal
+from app.settings import settings
+from app.sessions import services
+from app.sessions.models import Message
+from computer_use_demo.tools import ToolResult
+
+
+# Force disable authentication for tests
+settings.disable_auth = True
+
+client: TestClient = TestClient(app)
+
+
+def create_session_with_messages(count: int) -> tuple[str, List[int]]:
+    """Creates a session holding `count` messages and returns its id with the
+    message ids in (created_at, id) order. The last message is inserted with
+    the earliest timestamp, like a screenshot result buffered behind newer
+    rows, so its id does not follow the chronological order.
+    """
+    response: Response = client.post("/sessions/")
+    assert response.status_code == 200
+    session_id: str = response.json()["id"]
+
+    start: datetime = datetime(2025, 1, 1)
+    created_at: List[datetime] = [
+        start + timedelta(seconds=second) for second in range(1, count)
+    ]
+    created_at.append(start)
+
+    with SessionLocal() as db:
+        messages: List[Message] = [
+            Message(
+                session_id=session_id,
+                content=f'{{"type": "text", "text": "message {index}"}}',
+                created_at=timestamp,
+            )
+            for index, timestamp in enumerate(created_at)
+        ]
+        db.add_all(messages)
+        db.commit()
+        ordered: List[Message] = sorted(
+            messages, key=lambda message: (message.created_at, message.id)
+        )
+        return session_id, [message.id for message in ordered]
+
+
+def test_api_messages_pages_cover_history_in_order():
+    session_id, expected_ids = create_session_with_messages(8)
+    seen: List[int] = []
+    before_id: Any = None
+    try:
+        while True:
+            params: Dict[str, Any] = {"limit": 3}
+            if before_id is not None:
+                params["before_id"] = before_id
+            response: Response = client.get(
+                f"/sessions/{session_id}/messages", params=params
+            )
+            assert response.status_code == 200
+            page: List[int] = [message["id"] for message in response.json()]
+            if not page:
+                break
+            seen = page + seen
+            before_id = page[0]
+        assert seen == expected_ids, (
+            f"Expected {expected_ids}, but got {seen} walking the API pages"
+        )
+    finally:
+        client.delete(f"/sessions/{session_id}")
+
+
+def test_ui_messages_pages_cover_history_in_order(monkeypatch):
+    monkeypatch.setattr(settings, "message_page_size", 3)
+    session_id, expected_ids = create_session_with_messages(8)
+    seen: List[int] = []
+    params: Dict[str, Any] = {}
+    try:
+        while True:
+            response: Response = client.get(
+                f"/ui/sessions/{session_id}/messages", params=params
+            )
+            assert response.status_code == 200
+            body: Dict[str, Any] = response.json()
+            page: List[int] = [message["id"] for message in body["messages"]]
+            seen = page + seen
+            if not body["has_older"]:
+                break
+            params = {"before_id": page[0]}
+        assert seen == expected_ids, (
+            f"Expected {expected_ids}, but got {seen} walking the UI pages"
+        )
+    finally:
+        client.delete(f"/sessions/{session_id}")
+
+
+def test_ui_messages_exact_page_has_no_older(monkeypatch):
+    monkeypatch.setattr(settings, "message_page_size", 4)
+    session_id, expected_ids = create_session_with_messages(4)
+    try:
+        response: Response = client.get(f"/ui/sessions/{session_id}/messages")
+        assert response.status_code == 200
+        body: Dict[str, Any] = response.json()
+        assert [message["id"] for message in body["messages"]] == expected_ids
+        assert body["has_older"] is False, (
+            "Expected no older messages when the session holds exactly one page"
+        )
+    finally:
+        client.delete(f"/sessions/{session_id}")
+
+
+def create_screenshot_session() -> str:
+    """Creates a session that stores screenshots and returns its id."""
+    response: Response = client.post(
+        "/sessions/", json={"store_screenshots": True}
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def stored_tool_results(session_id: str) -> List[Dict[str, Any]]:
+    """Returns the stored tool results of a session in (created_at, id) order,
+    checking their timestamps never go backwards.
+    """
+    with SessionLocal() as db:
+        messages: List[Message] = services.get_messages(db, session_id)
+    created_at: List[datetime] = [message.created_at for message in messages]
+    assert created_at == sorted(created_at)
+    contents: List[Dict[str, Any]] = [
+        json.loads(message.content) for message in messages
+    ]
+    return [content for content in contents if content["type"] == "tool_result"]
+
+
+def test_screenshot_burst_keeps_every_tool_result(monkeypatch):
+    """A burst larger than the screenshot queue drops the oldest screenshots,
+    never the tool results they belong to.
+    """
+    burst: int = services.SCREENSHOT_QUEUE_SIZE + 3
+
+    async def sampling_loop(*, output_callback, tool_output_callback, **kwargs):
+        # Let the screenshot worker start waiting on its queue
+        await asyncio.sleep(0)
+        # The real loop calls the callbacks without awaiting them
+        output_callback({"type": "text", "text": "taking screenshots"})
+        for index in range(burst):
+            tool_output_callback(
+                ToolResult(output=f"output {index}", base64_image="aW1hZ2U="),
+                f"tool-{index}",
+            )
+        return kwargs["messages"]
+
+    async def resize_screenshot_in_pool(base64_image, scale, quality):
+        await asyncio.sleep(0)
+        return "cmVzaXplZA==", "image/webp"
+
+    monkeypatch.setattr(services, "sampling_loop", sampling_loop)
+    monkeypatch.setattr(services, "resize_screenshot_in_pool", resize_screenshot_in_pool)
+    session_id: str = create_screenshot_session()
+    try:
+        asyncio.run(services.run_agent(session_id, "burst", SessionLocal, api_key="test"))
+
+        results: List[Dict[str, Any]] = stored_tool_results(session_id)
+        assert [result["tool_id"] for result in results] == [
+            f"tool-{index}" for index in range(burst)
+        ]
+        dropped: int = burst - services.SCREENSHOT_QUEUE_SIZE
+        for result in results[:dropped]:
+            assert "screenshot" not in result, (
+                f"Expected {result['tool_id']} to lose its screenshot"
+            )
+        for result in results[dropped:]:
+            assert result["screenshot"] == "cmVzaXplZA=="
+            assert result["screenshot_media_type"] == "image/webp"
+        assert client.get(f"/sessions/{session_id}").json()["status"] == "completed"
+    finally:
+        client.delete(f"/sessions/{session_id}")
+
+
+def test_cancel_mid_resize_keeps_pending_tool_results(monkeypatch):
+    """Cancelling while a screenshot is being resized stores the in-flight and
+    queued tool results without their screenshots.
+    """
+    resizing: List[asyncio.Event] = []
+
+    async def sampling_loop(*, output_callback, tool_output_callback, **kwargs):
+        await asyncio.sleep(0)
+        for index in range(3):
+            tool_output_callback(
+                ToolResult(output=f"output {index}", base64_image="aW1hZ2U="),
+                f"tool-{index}",
+            )
+        # Wait for the cancellation
+        await asyncio.Event().wait()
+
+    async def resize_screenshot_in_pool(base64_image, scale, quality):
+        resizing[0].set()
+        # Never finishes, so the first screenshot stays in flight
+        await asyncio.Event().wait()
+
+    async def run_and_cancel(session_id: str):
+        resizing.append(asyncio.Event())
+        task: asyncio.Task = services.start_agent_task(
+            session_id, "cancel", SessionLocal, api_key="test"
+        )
+        await resizing[0].wait()
+        services.cancel_agent_task(session_id)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    monkeypatch.setattr(services, "sampling_loop", sampling_loop)
+    monkeypatch.setattr(services, "resize_screenshot_in_pool", resize_screenshot_in_pool)
+    session_id: str = create_screenshot_session()
+    try:
+        asyncio.run(run_and_cancel(session_id))
+
+        results: List[Dict[str, Any]] = stored_tool_results(session_id)
+        assert [result["tool_id"] for result in results] == [
+            "tool-0", "tool-1", "tool-2"
+        ]
+        for result in results:
+            assert "screenshot" not in result, (
+                f"Expected {result['tool_id']} to be stored without a screenshot"
+            )
+        assert client.get(f"/sessions/{session_id}").json()["status"] == "cancelled"
+    finally:
+        client.delete(f"/sessions/{session_id}")
@@ -1,6 +1,6 @@
 """API endpoints for session management."""
-from typing import List
-from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from app.database import get_session as get_db
@@ -23,7 +23,7 @@ def create_session(
 
 @router.get("/", response_model=List[SessionResponse])
 def list_sessions(db: Session = Depends(get_db)):
-    """List all sessions."""
+    """List the most recent sessions."""
     sessions = services.list_sessions(db)
     return sessions
 
@@ -38,9 +38,14 @@ def get_session(session_id: str, db: Session = Depends(get_db)):
 
 
 @router.get("/{session_id}/messages", response_model=List[MessageResponse])
-def get_messages(session_id: str, db: Session = Depends(get_db)):
-    """Get all messages for a session."""
-    messages = services.get_messages(db, session_id)
+def get_messages(
+    session_id: str,
+    before_id: Optional[int] = Query(default=None, description="Only return messages that sort before message `before_id`"),
+    limit: Optional[int] = Query(default=None, ge=1, le=1000, description="Return at most this many of the newest matching messages"),
+    db: Session = Depends(get_db),
+):
+    """Get messages for a session, optionally paginated backwards from `before_id`."""
+    messages = services.get_messages(db, session_id, before_id=before_id, limit=limit)
     return messages
 
 
@@ -67,13 +72,12 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
     """WebSocket endpoint for real-time agent interaction."""
     await websocket.accept()
 
-    # Get a database session
     from app.database import SessionLocal
-    db = SessionLocal()
 
     try:
-        # Check if session exists
-        session = services.get_session(db, session_id)
+        # Check if session exists, holding a connection only for the lookup
+        with SessionLocal() as db:
+            session = services.get_session(db, session_id)
         if not session:
             await websocket.send_json({"type": "error", "content": {"error": "Session not found"}})
             await websocket.close()
@@ -91,8 +95,8 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         # Get API key from message or environment
         api_key = data.get("api_key") or None
 
-        # Start agent task
-        task = services.start_agent_task(session_id, message, db, websocket, api_key)
+        # Start agent task; it checks out its own short-lived DB sessions
+        task = services.start_agent_task(session_id, message, SessionLocal, websocket, api_key)
 
         # Wait for task completion
         await task
@@ -105,5 +109,3 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
             await websocket.send_json({"type": "error", "content": {"error": str(e)}})
         except:
             pass  # WebSocket might be closed
-    finally:
-        db.close()
@@ -25,6 +25,9 @@ class Settings(BaseSettings):
 
     # Agent settings
     message_batch_size: int = 10  # Batch size for database commits during agent execution
+    message_flush_interval: float = 0.2  # Max seconds buffered messages wait before a commit
+    session_list_page_size: int = 100  # Max sessions returned when listing
+    message_page_size: int = 50  # Messages rendered per page in the session UI
 
     # Cors
     backend_cors_origins: List[str] = ["*"]
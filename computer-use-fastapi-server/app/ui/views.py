@@ -1,11 +1,15 @@
 """UI views for rendering HTML templates."""
-from fastapi import APIRouter, Depends, Request
+from typing import Optional
+import orjson
+from fastapi import APIRouter, Depends, Query, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
 from app.database import get_session as get_db
 from app.sessions import services
+from app.sessions.models import Message as MessageModel
+from app.settings import settings
 
 templates = Jinja2Templates(directory="app/templates")
 
@@ -14,7 +18,7 @@ router = APIRouter(prefix="/ui", tags=["ui"])
 
 @router.get("/", response_class=HTMLResponse)
 async def index(request: Request, db: Session = Depends(get_db)):
-    """Homepage - list all sessions."""
+    """Homepage - list the most recent sessions."""
     sessions = services.list_sessions(db)
     return templates.TemplateResponse(
         "sessions_list.html",
@@ -29,6 +33,56 @@ async def create_session_ui(db: Session = Depends(get_db)):
     return RedirectResponse(url=f"/ui/sessions/{session.id}", status_code=303)
 
 
+def _format_user(content_json: dict) -> tuple[str, str]:
+    return "user", content_json.get("text", "")
+
+
+def _format_text(content_json: dict) -> tuple[str, str]:
+    return "assistant", content_json.get("text", "")
+
+
+def _format_thinking(content_json: dict) -> tuple[str, str]:
+    return "thinking", f"[Thinking] {content_json.get('thinking', '...')}"
+
+
+def _format_tool_use(content_json: dict) -> tuple[str, str]:
+    tool_input = orjson.dumps(content_json.get("input"), option=orjson.OPT_INDENT_2).decode()
+    return "tool", f"🔧 Tool: {content_json.get('name')}\nInput: {tool_input}"
+
+
+def _format_tool_result(content_json: dict) -> tuple[str, str]:
+    output = content_json.get("output", "No output")
+    error = content_json.get("error", "")
+    return "tool", f"✓ Tool Result\n{error if error else output}"
+
+
+def _format_default(content_json: dict) -> tuple[str, str]:
+    return "assistant", orjson.dumps(content_json, option=orjson.OPT_INDENT_2).decode()
+
+
+# Display formatter per stored content block type
+TYPE_FORMATTERS = {
+    "text": _format_text,
+    "thinking": _format_thinking,
+    "tool_use": _format_tool_use,
+    "tool_result": _format_tool_result,
+}
+
+
+def _format_message(msg: MessageModel) -> dict:
+    """Parse a stored message into its display type and text."""
+    try:
+        content_json = orjson.loads(msg.content)
+        if content_json.get("role") == "user":
+            formatter = _format_user
+        else:
+            formatter = TYPE_FORMATTERS.get(content_json.get("type"), _format_default)
+        msg_type, content = formatter(content_json)
+        return {"id": msg.id, "type": msg_type, "content": content}
+    except:
+        return {"id": msg.id, "type": "assistant", "content": msg.content}
+
+
 @router.get("/sessions/{session_id}", response_class=HTMLResponse)
 async def session_detail(
     request: Request,
@@ -40,41 +94,39 @@ async def session_detail(
     if not session:
         return RedirectResponse(url="/ui/")
 
-    # Get messages and parse them for display
-    messages_raw = services.get_messages(db, session_id)
-    messages = []
-
-    for msg in messages_raw:
-        import json
-        try:
-            content_json = json.loads(msg.content)
-            msg_type = "assistant"
-
-            # Determine message type and format content
-            if content_json.get("role") == "user":
-                msg_type = "user"
-                content = content_json.get("text", "")
-            elif content_json.get("type") == "text":
-                content = content_json.get("text", "")
-            elif content_json.get("type") == "thinking":
-                msg_type = "thinking"
-                content = f"[Thinking] {content_json.get('thinking', '...')}"
-            elif content_json.get("type") == "tool_use":
-                msg_type = "tool"
-                content = f"🔧 Tool: {content_json.get('name')}\nInput: {json.dumps(content_json.get('input'), indent=2)}"
-            elif content_json.get("type") == "tool_result":
-                msg_type = "tool"
-                output = content_json.get("output", "No output")
-                error = content_json.get("error", "")
-                content = f"✓ Tool Result\n{error if error else output}"
-            else:
-                content = json.dumps(content_json, indent=2)
-
-            messages.append({"type": msg_type, "content": content})
-        except:
-            messages.append({"type": "assistant", "content": msg.content})
+    # Render only the most recent page; older messages are loaded on demand
+    page_size = settings.message_page_size
+    messages_raw = services.get_messages(db, session_id, limit=page_size + 1)
+
+    # The extra row only tells us whether older history exists
+    has_older = len(messages_raw) > page_size
+    messages = [_format_message(msg) for msg in messages_raw[-page_size:]]
 
     return templates.TemplateResponse(
         "session_detail.html",
-        {"request": request, "session": session, "messages": messages}
+        {
+            "request": request,
+            "session": session,
+            "messages": messages,
+            "page_size": page_size,
+            "has_older": has_older,
+        }
+    )
+
+
+@router.get("/sessions/{session_id}/messages")
+async def session_messages(
+    session_id: str,
+    before_id: Optional[int] = Query(default=None),
+    limit: Optional[int] = Query(default=None, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """Formatted messages for lazy-loading older history on the session page."""
+    page_size = limit or settings.message_page_size
+    messages_raw = services.get_messages(
+        db, session_id, before_id=before_id, limit=page_size + 1
     )
+    return {
+        "messages": [_format_message(msg) for msg in messages_raw[-page_size:]],
+        "has_older": len(messages_raw) > page_size,
+    }
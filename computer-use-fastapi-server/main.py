@@ -4,17 +4,28 @@ FastAPI
 Production and Planning Software.
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse, RedirectResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.router import api_router
 from app.settings import settings
 from app.database import DeclarativeBase, engine
+from app.sessions.screenshots import shutdown_resize_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Stop screenshot resize workers with the server
+    shutdown_resize_pool()
+
 
 def main() -> FastAPI:
     app = FastAPI(
         title="Energent.ai Test",
         default_response_class=ORJSONResponse,
+        lifespan=lifespan,
     )
     app.include_router(api_router)
     app.add_middleware(